@@ -1,7 +1,13 @@
 import os
+import stat
 import struct
 import time
 import hashlib
+import mmap
+import sys
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Dict, Tuple, Optional
 
 
@@ -12,14 +18,36 @@ class FURGfs3:
     HEADER_SIZE = 128           # Tamanho do cabeçalho do sistema
     ENTRY_SIZE = 64             # Tamanho de cada entrada de diretório
     FAT_ENTRY_SIZE = 4          # Tamanho de cada entrada na FAT
+    COPY_CHUNK_SIZE = 1024 * 1024  # Leitura em blocos de arquivos reais
+    DIR_CACHE_SIZE = 256        # Blocos de diretório decodificados mantidos em cache
+    # Layouts fixos compilados uma única vez (cabeçalho e entrada de diretório)
+    _HEADER_STRUCT = struct.Struct('<8I32s')
+    _ENTRY_STRUCT = struct.Struct('<32s4I2H12x')
+    _PROTECTED_STRUCT = struct.Struct('<H')       # Campo 'protegido' da entrada
+    _PROTECTED_OFFSET = struct.calcsize('<32s4I')   # Após o nome e os 4 uint32
+    _FREE_TABLE = bytes([1]) + bytes(255)  # Byte 0 -> livre (1), demais -> 0
+    _ZERO_BLOCK = bytes(BLOCK_SIZE)  # Bloco zerado reutilizado (sem alocar a cada uso)
+    _MADV_WILLNEED = getattr(mmap, 'MADV_WILLNEED', None)  # Python 3.8+ / POSIX
+    _NAME_CHARS = bytes(c for c in range(128)  # ASCII aceito em nomes
+                        if 32 <= c <= 126 or chr(c).isspace())
 
     def __init__(self, filename: str = None):
         self.filename = filename
         self.file_handle = None     # Handle do arquivo do sistema
+        self._mm = None             # Arquivo do sistema mapeado em memória
         self.header = {}            # Cabeçalho do sistema
-        self.fat = []               # Tabela de alocação de arquivos (FAT)
+        self._data_base = 0         # Posição do bloco 0 virtual (data_start - BLOCK_SIZE)
+        self.fat = array('I')       # Tabela de alocação de arquivos (FAT)
+        self._fat_dirty_pages = set()  # Páginas da FAT alteradas e não persistidas
+        self._next_free_hint = 1    # Nenhum bloco livre antes desta posição
+        self._free_map = bytearray()  # 1 byte por bloco: 1 = livre
+        self._data_blocks = 0       # Blocos alocáveis (1 até o fim da imagem)
+        self._copy_buffer = None    # Buffer reutilizado na leitura de arquivos reais
+        self._dir_cache = OrderedDict()  # Entradas por bloco de diretório (LRU)
+        self._dir_size_cache = {}   # Tamanho recursivo memorizado por diretório
         self.current_directory = 0  # Bloco do diretório atual
         self.directory_path = ["/"]  # Caminho atual
+        self.directory_blocks = [0]  # Bloco de cada nível de directory_path
         self.script_dir = os.path.dirname(
             os.path.abspath(__file__))  # Pasta do script
 
@@ -27,36 +55,133 @@ class FURGfs3:
         """Calcula hash MD5 para verificação de integridade"""
         return hashlib.md5(content).hexdigest()
 
-    def _read_file_from_fs(self, filename: str) -> bytes:
-        """Lê o conteúdo completo de um arquivo do FURGfs3"""
-        entries = self._read_directory()
-        entry = next(
-            (e for e in entries if e['name'] == filename and e['type'] == 0), None)
-        if not entry:
-            return None
-
-        try:
-            # Lê o arquivo bloco por bloco seguindo a cadeia da FAT
-            content, current_block, bytes_left = b'', entry['start_block'], entry['size']
-            while current_block != 1 and bytes_left > 0:
-                block_start = self.header['data_start'] + \
-                    (current_block - 1) * self.BLOCK_SIZE
-                self.file_handle.seek(block_start)
-                chunk_size = min(self.BLOCK_SIZE, bytes_left)
-                content += self.file_handle.read(chunk_size)
+    def _hash_real_file(self, path: str) -> str:
+        """Calcula o MD5 de um arquivo do sistema real lendo-o em blocos"""
+        md5 = hashlib.md5()
+        if self._copy_buffer is None:
+            self._copy_buffer = bytearray(self.COPY_CHUNK_SIZE)
+        # Reaproveita o mesmo buffer em todas as leituras (readinto não aloca)
+        with open(path, 'rb') as f, memoryview(self._copy_buffer) as buffer:
+            size = f.readinto(buffer)
+            while size:
+                with buffer[:size] as chunk:
+                    md5.update(chunk)
+                size = f.readinto(buffer)
+        return md5.hexdigest()
+
+    def _stream_extents(self, extents: List[Tuple[int, int]], size: int, sink=None) -> Tuple[str, int]:
+        """Calcula o MD5 dos trechos de um arquivo do FS, copiando-os para sink se informado"""
+        # Cada trecho é uma visão do mmap: nada é copiado para objetos bytes
+        md5, bytes_left = hashlib.md5(), size
+        base, block_size = self._data_base, self.BLOCK_SIZE
+        with memoryview(self._mm) as fs_view:
+            for start, count in extents:
+                block_start = base + start * block_size
+                chunk_size = min(count * block_size, bytes_left)
+                self._advise(block_start, chunk_size, self._MADV_WILLNEED)
+                with fs_view[block_start:block_start + chunk_size] as chunk:
+                    md5.update(chunk)
+                    if sink is not None:
+                        sink.write(chunk)
                 bytes_left -= chunk_size
-                next_block = self.fat[current_block]
-                if next_block in [1, 0]:
-                    break  # Fim da cadeia
-                current_block = next_block
-            return content
-        except Exception as e:
-            print(f"Erro ao ler arquivo do FS: {e}")
-            return None
+        return md5.hexdigest(), size - bytes_left
+
+    def _read_at(self, position: int, size: int) -> bytes:
+        """Lê bytes de uma posição absoluta do arquivo mapeado"""
+        return self._mm[position:position + size]
+
+    def _advise(self, position: int, size: int, advice: Optional[int]):
+        """Informa ao kernel o padrão de acesso a um trecho do mapeamento"""
+        # madvise exige início alinhado à página; sem suporte, é só uma dica perdida
+        if advice is None or size <= 0:
+            return
+        start = position - position % mmap.PAGESIZE
+        try:
+            self._mm.madvise(advice, start, position + size - start)
+        except (AttributeError, OSError, ValueError):
+            pass
+
+    def _write_at(self, position: int, data: bytes):
+        """Escreve bytes em uma posição absoluta do arquivo mapeado"""
+        self._mm[position:position + len(data)] = data
+
+    def _write_if_changed(self, position: int, data: bytes) -> bool:
+        """Escreve metadados apenas se diferirem do conteúdo atual do arquivo"""
+        # Evita sujar páginas (e a gravação delas no disco) em escritas inócuas
+        with memoryview(self._mm) as view, view[position:position + len(data)] as current:
+            if current == data:
+                return False
+        self._write_at(position, data)
+        return True
+
+    def _group_contiguous(self, blocks: List[int]) -> List[Tuple[int, int]]:
+        """Agrupa blocos consecutivos em trechos (bloco inicial, quantidade)"""
+        runs = []
+        for block in blocks:
+            if runs and runs[-1][0] + runs[-1][1] == block:
+                runs[-1][1] += 1
+            else:
+                runs.append([block, 1])
+        return [(start, count) for start, count in runs]
+
+    def _linked_run_length(self, start: int, limit: int) -> int:
+        """Conta, até limit, quantos blocos a partir de start apontam para o seguinte na FAT"""
+        # Compara fatias da FAT com a sequência esperada (em C), dobrando o
+        # tamanho a cada acerto; só o pedaço com a quebra é percorrido em Python
+        length, step = 0, 16
+        while length < limit:
+            first = start + length
+            count = min(step, limit - length)
+            if self.fat[first:first + count] != array('I', range(first + 1, first + count + 1)):
+                while first < len(self.fat) and self.fat[first] == first + 1:
+                    first += 1
+                return first - start
+            length, step = length + count, step * 2
+        return length
+
+    def _chain_extents(self, start_block: int, size: int = None) -> List[Tuple[int, int]]:
+        """Segue a cadeia da FAT e retorna os trechos (bloco inicial, quantidade) do arquivo"""
+        # Sem tamanho, segue a cadeia inteira (limitada ao total de blocos)
+        if size is None:
+            blocks_left = len(self.fat)
+        else:
+            blocks_left = (size + self.BLOCK_SIZE - 1) // self.BLOCK_SIZE
+        extents, current_block = [], start_block
+        while current_block not in [1, 0] and blocks_left > 0:
+            # Um trecho contíguo inteiro por iteração, não um bloco
+            count = self._linked_run_length(current_block, blocks_left - 1) + 1
+            extents.append((current_block, count))
+            blocks_left -= count
+            next_block = self.fat[current_block + count - 1]
+            if next_block in [1, 0]:
+                break  # Fim da cadeia
+            current_block = next_block
+        return extents
+
+    def _fat_from_bytes(self, raw: bytes) -> array:
+        """Converte a imagem little-endian da FAT em um array de uint32"""
+        fat = array('I')
+        fat.frombytes(raw)  # Aceita qualquer buffer, inclusive visões do mmap
+        if sys.byteorder == 'big':
+            fat.byteswap()
+        return fat
+
+    def _fat_to_bytes(self, fat: array, first: int = 0, last: int = None):
+        """Serializa fat[first:last] no formato little-endian do disco"""
+        if last is None:
+            last = len(fat)
+        if sys.byteorder == 'big':
+            fat = fat[first:last]
+            fat.byteswap()
+            return fat.tobytes()
+        # Em máquinas little-endian o buffer do array já está no formato do
+        # disco: devolve uma visão dele, sem copiar as entradas
+        return memoryview(fat)[first:last].cast('B')
 
     def create_filesystem(self, filename: str, size_mb: int) -> bool:
         """Cria um novo sistema de arquivos FURGfs3"""
         self.directory_path, self.current_directory = ["/"], 0
+        self.directory_blocks = [0]
         if not filename.endswith('.fs'):
             filename += '.fs'
         if size_mb < 1 or size_mb > 10000:
@@ -75,23 +200,22 @@ class FURGfs3:
         try:
             with open(full_path, 'wb') as f:
                 # Escreve cabeçalho com metadados do sistema
-                header_data = struct.pack('<8I32s', self.HEADER_SIZE, self.BLOCK_SIZE, total_bytes,
-                                          fat_start, root_start, data_start, total_blocks, 0,
-                                          b'FURGfs3' + b'\x00' * 24)
+                header_data = self._HEADER_STRUCT.pack(self.HEADER_SIZE, self.BLOCK_SIZE, total_bytes,
+                                                       fat_start, root_start, data_start, total_blocks, 0,
+                                                       b'FURGfs3' + b'\x00' * 24)
                 f.write(header_data.ljust(self.HEADER_SIZE, b'\x00'))
 
                 # Inicializa FAT (todos blocos livres, exceto bloco 0 reservado)
-                fat = [0] * total_blocks
+                fat = array('I', bytes(fat_size))
                 fat[0] = 1  # Bloco 0 reservado
-                for entry in fat:
-                    f.write(struct.pack('<I', entry & 0xFFFFFFFF))
+                f.write(self._fat_to_bytes(fat))
 
-                # Preenche resto do arquivo com zeros
-                remaining = total_bytes - f.tell()
-                while remaining > 0:
-                    write_size = min(8192, remaining)
-                    f.write(b'\x00' * write_size)
-                    remaining -= write_size
+                # Reserva o resto do arquivo (já zerado) sem escrever os zeros
+                f.flush()
+                try:
+                    os.posix_fallocate(f.fileno(), 0, total_bytes)
+                except (AttributeError, OSError):
+                    f.truncate(total_bytes)  # Sem fallocate: arquivo esparso
 
             self.filename = full_path
             self._load_filesystem()
@@ -117,14 +241,18 @@ class FURGfs3:
                 print("Arquivo muito pequeno")
                 return False
 
-            self.file_handle = open(self.filename, 'r+b')
-            header_data = self.file_handle.read(self.HEADER_SIZE)
+            # Mapeia o arquivo inteiro: blocos viram fatias de memória
+            self.close()
+            self.file_handle = open(self.filename, 'r+b', buffering=0)
+            self._mm = mmap.mmap(self.file_handle.fileno(),
+                                 0, access=mmap.ACCESS_WRITE)
+            header_data = self._read_at(0, self.HEADER_SIZE)
             if len(header_data) < self.HEADER_SIZE:
                 print("Não foi possível ler o cabeçalho")
                 return False
 
             # Decodifica cabeçalho
-            header_values = struct.unpack('<8I32s', header_data[:64])
+            header_values = self._HEADER_STRUCT.unpack_from(header_data)
             if not header_values[8].startswith(b'FURGfs3'):
                 print("Assinatura inválida")
                 return False
@@ -137,16 +265,34 @@ class FURGfs3:
                 'total_blocks': header_values[6], 'free_blocks': header_values[7],
                 'signature': header_values[8]
             }
+            # Bloco k começa em data_start + (k - 1) * BLOCK_SIZE = _data_base + k * BLOCK_SIZE
+            self._data_base = self.header['data_start'] - self.BLOCK_SIZE
 
             if self.header['total_size'] != file_size:
                 print(f"Aviso: Tamanho no cabeçalho difere do real")
 
-            # Carrega FAT na memória
-            self.file_handle.seek(self.header['fat_start'])
-            self.fat = [struct.unpack('<I', self.file_handle.read(4))[0]
-                        for _ in range(self.header['total_blocks'])]
+            # Carrega FAT na memória copiando-a direto do mapeamento
+            fat_start = self.header['fat_start']
+            fat_size = self.header['total_blocks'] * self.FAT_ENTRY_SIZE
+            if fat_start + fat_size > file_size:
+                print("Não foi possível ler a FAT")
+                return False
+            self._advise(fat_start, fat_size, self._MADV_WILLNEED)  # Leitura antecipada
+            with memoryview(self._mm) as view, view[fat_start:fat_start + fat_size] as fat_data:
+                self.fat = self._fat_from_bytes(fat_data)
+            self._fat_dirty_pages, self._next_free_hint = set(), 1
+            self._dir_cache, self._dir_size_cache = OrderedDict(), {}
+            self._build_free_map()
+
+            # Blocos cujos dados ficariam além do fim do arquivo não são alocados
+            first_outside = max(
+                1, (file_size - self.header['data_start']) // self.BLOCK_SIZE + 1)
+            self._free_map[first_outside:] = bytes(
+                max(0, len(self._free_map) - first_outside))
+            self._data_blocks = min(first_outside, len(self._free_map)) - 1
 
             self.current_directory, self.directory_path = 0, ["/"]
+            self.directory_blocks = [0]
             return True
         except Exception as e:
             print(f"Erro ao carregar sistema: {e}")
@@ -154,71 +300,180 @@ class FURGfs3:
 
     def _get_directory_block_position(self, block_num: int) -> int:
         """Retorna posição no arquivo para um bloco de diretório"""
-        return self.header['root_start'] if block_num == 0 else self.header['data_start'] + (block_num - 1) * self.BLOCK_SIZE
-
-    def _find_free_block(self) -> int:
-        """Encontra primeiro bloco livre na FAT"""
-        return next((i for i, entry in enumerate(self.fat) if entry == 0), -1)
+        return self.header['root_start'] if block_num == 0 else self._data_base + block_num * self.BLOCK_SIZE
+
+    def _build_free_map(self):
+        """Reconstrói o mapa de blocos livres a partir da FAT"""
+        # Uma entrada está livre quando seus 4 bytes são zero: combina os
+        # 4 planos de bytes com um OR de inteiros e traduz 0 -> 1, resto -> 0
+        raw = self.fat.tobytes()
+        used = 0
+        for plane in range(self.FAT_ENTRY_SIZE):
+            used |= int.from_bytes(raw[plane::self.FAT_ENTRY_SIZE], 'little')
+        self._free_map = bytearray(used.to_bytes(
+            len(self.fat), 'little').translate(self._FREE_TABLE))
+
+    def _set_fat(self, index: int, value: int):
+        """Altera uma entrada da FAT e marca sua página como suja"""
+        self.fat[index] = value
+        self._free_map[index] = 1 if value == 0 else 0
+        self._fat_dirty_pages.add(
+            index * self.FAT_ENTRY_SIZE // self.BLOCK_SIZE)
+        if value == 0 and index < self._next_free_hint:
+            self._next_free_hint = index  # Bloco liberado antes da dica
+
+    def _mark_fat_pages(self, first: int, last: int):
+        """Marca como sujas as páginas da FAT que cobrem as entradas [first, last)"""
+        self._fat_dirty_pages.update(range(
+            first * self.FAT_ENTRY_SIZE // self.BLOCK_SIZE,
+            (last - 1) * self.FAT_ENTRY_SIZE // self.BLOCK_SIZE + 1))
+
+    def _link_run(self, start: int, count: int, next_block: int):
+        """Encadeia blocos consecutivos na FAT com uma atribuição de fatia"""
+        last = start + count - 1
+        self.fat[start:last] = array('I', range(start + 1, last + 1))
+        self.fat[last] = next_block
+        self._free_map[start:last + 1] = bytes(count)
+        self._mark_fat_pages(start, last + 1)
+
+    def _free_run(self, start: int, count: int):
+        """Libera blocos consecutivos na FAT com uma atribuição de fatia"""
+        self.fat[start:start + count] = array('I', bytes(count * self.FAT_ENTRY_SIZE))
+        self._free_map[start:start + count] = b'\x01' * count
+        self._mark_fat_pages(start, start + count)
+        if start < self._next_free_hint:
+            self._next_free_hint = start  # Bloco liberado antes da dica
 
     def _allocate_blocks(self, num_blocks: int) -> List[int]:
         """Aloca uma cadeia de blocos na FAT"""
-        blocks = []
-        for _ in range(num_blocks):
-            block = self._find_free_block()
-            if block == -1:
-                # Rollback: libera blocos já alocados
-                for b in blocks:
-                    self.fat[b] = 0
-                return []
-            blocks.append(block)
-            self.fat[block] = 1  # Marca como ocupado
-
-        # Liga os blocos em cadeia
-        for i in range(len(blocks) - 1):
-            self.fat[blocks[i]] = blocks[i + 1]
-        if blocks:
-            self.fat[blocks[-1]] = 1  # Marca fim da cadeia
+        # Percorre os trechos livres a partir da dica (um par de buscas em C
+        # por trecho; não há blocos livres antes dela) procurando o primeiro
+        # que caiba inteiro, e guarda os primeiros trechos espalhados caso
+        # nenhum caiba, sem alterar a FAT até o fim
+        free_map, size = self._free_map, len(self._free_map)
+        runs, needed = [], num_blocks
+        start = free_map.find(1, self._next_free_hint)
+        while start != -1:
+            end = free_map.find(0, start)
+            end = end if end != -1 else size
+            if end - start >= num_blocks:
+                # Trecho contíguo: uma leitura/escrita por arquivo
+                self._link_run(start, num_blocks, 1)  # 1 = fim da cadeia
+                if start == self._next_free_hint:
+                    self._next_free_hint = start + num_blocks
+                return list(range(start, start + num_blocks))
+            if needed:
+                count = min(end - start, needed)
+                runs.append((start, count))
+                needed -= count
+            start = free_map.find(1, end) if end < size else -1
+        if needed:
+            return []  # Espaço insuficiente: nada foi alocado
+
+        # Liga os blocos em cadeia, um trecho contíguo por vez
+        blocks = [b for start, count in runs for b in range(start, start + count)]
+        self._next_free_hint = blocks[-1] + 1
+        for i, (start, count) in enumerate(runs):
+            next_block = runs[i + 1][0] if i + 1 < len(runs) else 1  # 1 = fim
+            self._link_run(start, count, next_block)
         return blocks
 
     def _calculate_directory_size(self, directory_block: int) -> int:
         """Calcula tamanho total recursivo de um diretório"""
-        total_size = 0
-        for entry in self._read_directory(directory_block):
-            if entry['type'] == 0:
-                total_size += entry['size']  # Arquivo
-            elif entry['type'] == 1:
-                # Subdiretório
-                total_size += self._calculate_directory_size(
-                    entry['start_block'])
-        return total_size
+        if directory_block in self._dir_size_cache:
+            return self._dir_size_cache[directory_block]
+
+        # Percurso em profundidade com pilha explícita (sem limite de recursão);
+        # cada quadro guarda [bloco, iterador das entradas, soma parcial]
+        frames = [[directory_block, iter(self._read_directory(directory_block)), 0]]
+        path = {directory_block}  # Diretórios abertos: evita ciclos em imagens corrompidas
+        while frames:
+            frame = frames[-1]
+            for entry in frame[1]:
+                if entry['type'] == 0:
+                    frame[2] += entry['size']  # Arquivo
+                elif entry['type'] == 1:
+                    # Subdiretório: usa o tamanho memorizado ou desce nele
+                    child = entry['start_block']
+                    if child in self._dir_size_cache:
+                        frame[2] += self._dir_size_cache[child]
+                    elif child not in path:
+                        path.add(child)
+                        frames.append([child, iter(self._read_directory(child)), 0])
+                        break
+            else:
+                # Entradas esgotadas: memoriza e soma no diretório pai
+                frames.pop()
+                path.discard(frame[0])
+                self._dir_size_cache[frame[0]] = frame[2]
+                if frames:
+                    frames[-1][2] += frame[2]
+        return self._dir_size_cache[directory_block]
 
     def _read_directory(self, directory_block: int = None, calculate_sizes: bool = False) -> List[Dict]:
         """Lê entradas do diretório especificado"""
         if directory_block is None:
             directory_block = self.current_directory
+        entries = self._dir_cache.get(directory_block)
+        if entries is None:
+            entries = self._dir_cache[directory_block] = self._parse_directory_block(
+                directory_block)
+            if len(self._dir_cache) > self.DIR_CACHE_SIZE:
+                self._dir_cache.popitem(last=False)  # Descarta o menos usado
+        else:
+            self._dir_cache.move_to_end(directory_block)
+        if not calculate_sizes:
+            # Uso interno: os dicts pertencem ao cache e não devem ser alterados
+            return list(entries)
+
+        # Entregues para fora (list_files): cópias, com o tamanho recursivo
+        # calculado para os diretórios
+        result = []
+        for entry in entries:
+            entry = dict(entry)
+            if entry['type'] == 1:
+                try:
+                    entry['calculated_size'] = self._calculate_directory_size(
+                        entry['start_block'])
+                except:
+                    entry['calculated_size'] = 0
+            result.append(entry)
+        return result
+
+    def _invalidate_directory(self, directory_block: int):
+        """Descarta as entradas em cache de um bloco de diretório alterado"""
+        self._dir_cache.pop(directory_block, None)
+        # Os tamanhos de todos os ancestrais mudam junto; como o bloco não
+        # guarda o próprio pai, descarta os tamanhos memorizados de uma vez
+        self._dir_size_cache.clear()
+
+    def _parse_directory_block(self, directory_block: int) -> List[Dict]:
+        """Decodifica as entradas válidas de um bloco de diretório"""
         dir_position = self._get_directory_block_position(directory_block)
-        self.file_handle.seek(dir_position)
         entries = []
 
-        # Lê todas as entradas possíveis no bloco de diretório
-        for _ in range(self.BLOCK_SIZE // self.ENTRY_SIZE):
-            data = self.file_handle.read(self.ENTRY_SIZE)
-            if len(data) < self.ENTRY_SIZE or all(b == 0 for b in data):
+        # Lê o bloco de diretório inteiro de uma vez e decodifica todas as
+        # entradas com um único iter_unpack (só entradas completas)
+        block = self._read_at(dir_position, self.BLOCK_SIZE)
+        block = block[:len(block) - len(block) % self.ENTRY_SIZE]
+        for slot, values in enumerate(self._ENTRY_STRUCT.iter_unpack(block)):
+            if values[0][0] == 0:
                 continue  # Entrada vazia
 
             try:
-                # Decodifica estrutura da entrada de diretório
-                values = struct.unpack('<32s4I2H12x', data)
                 name_bytes, size, start_block, timestamp, protected_val, entry_type = values[
                     0], values[1], values[2], values[3], values[5], values[6]
 
+                name_bytes = name_bytes.rstrip(b'\x00')
                 try:
-                    name = name_bytes.rstrip(b'\x00').decode('utf-8')
+                    name = name_bytes.decode('utf-8')
                 except:
                     continue
 
-                # Valida nome do arquivo
-                if not name or not all(32 <= ord(c) <= 126 or c.isspace() for c in name):
+                # Valida nome do arquivo: bytes ASCII válidos são removidos em C;
+                # só nomes com outros bytes passam pela verificação por caractere
+                if not name or (name_bytes.translate(None, self._NAME_CHARS) and
+                                not all(32 <= ord(c) <= 126 or c.isspace() for c in name)):
                     continue
 
                 # Valida campos da entrada
@@ -226,18 +481,9 @@ class FURGfs3:
                         protected_val not in [0, 1] or timestamp < 0 or timestamp > 2**31):
                     continue
 
-                entry = {'name': name, 'size': size, 'start_block': start_block,
-                         'timestamp': timestamp, 'protected': bool(protected_val), 'type': entry_type}
-
-                # Calcula tamanho recursivo para diretórios se solicitado
-                if calculate_sizes and entry['type'] == 1:
-                    try:
-                        entry['calculated_size'] = self._calculate_directory_size(
-                            entry['start_block'])
-                    except:
-                        entry['calculated_size'] = 0
-
-                entries.append(entry)
+                entries.append({'name': name, 'size': size, 'start_block': start_block,
+                                'timestamp': timestamp, 'protected': bool(protected_val),
+                                'type': entry_type, 'slot': slot})
             except:
                 continue
         return entries
@@ -248,44 +494,49 @@ class FURGfs3:
             directory_block = self.current_directory
         dir_position = self._get_directory_block_position(directory_block)
 
-        # Encontra posição livre se não especificada
+        # Encontra posição livre se não especificada: o fatiamento com passo
+        # ENTRY_SIZE junta o 1º byte de cada entrada e find busca o zero em C
         if position == -1:
-            self.file_handle.seek(dir_position)
-            for pos in range(self.BLOCK_SIZE // self.ENTRY_SIZE):
-                data = self.file_handle.read(self.ENTRY_SIZE)
-                if len(data) < self.ENTRY_SIZE or data[0] == 0:
-                    position = pos
-                    break
+            first_bytes = self._read_at(dir_position, self.BLOCK_SIZE)[::self.ENTRY_SIZE]
+            position = first_bytes.find(0)
 
         if position == -1:
             raise Exception("Diretório cheio")
 
-        # Escreve entrada no diretório
-        self.file_handle.seek(dir_position + position * self.ENTRY_SIZE)
-        name_bytes = entry['name'].encode(
-            'utf-8')[:self.MAX_FILENAME].ljust(self.MAX_FILENAME, b'\x00')
-        data = struct.pack('<32s4I2H12x', name_bytes, entry['size'], entry['start_block'],
-                           entry.get('timestamp', int(time.time())), 0,
-                           int(entry.get('protected', False)), entry.get('type', 0))
-        self.file_handle.write(data)
+        # Escreve entrada no diretório (struct completa o nome com zeros)
+        name_bytes = entry.get('name_bytes') or entry['name'].encode('utf-8')
+        data = self._ENTRY_STRUCT.pack(name_bytes[:self.MAX_FILENAME], entry['size'], entry['start_block'],
+                                       entry.get('timestamp', int(time.time())), 0,
+                                       int(entry.get('protected', False)), entry.get('type', 0))
+        self._write_if_changed(dir_position + position * self.ENTRY_SIZE, data)
+        self._invalidate_directory(directory_block)
+
+    def _encode_name(self, name: str) -> Optional[bytes]:
+        """Codifica um nome em UTF-8 validando seu tamanho em bytes"""
+        name_bytes = name.encode('utf-8')
+        if len(name_bytes) > self.MAX_FILENAME - 1:
+            print("Nome muito longo")
+            return None
+        return name_bytes
 
-    def _item_operation(self, name: str, item_type: int, operation: str) -> bool:
+    def _item_operation(self, name: str, item_type: int, operation: str, entries: List[Dict] = None) -> bool:
         """Operação genérica para itens (arquivos/diretórios)"""
-        entries = self._read_directory()
-        for i, entry in enumerate(entries):
+        if entries is None:
+            entries = self._read_directory()
+        for entry in entries:
             if entry['name'] == name and entry['type'] == item_type:
                 if entry.get('protected', False) and operation in ['remove', 'rename']:
                     print(
                         f"{'Arquivo' if item_type == 0 else 'Diretório'} protegido")
                     return False
-                return i, entry
+                return entry['slot'], entry  # Posição real da entrada no bloco
         print(f"{'Arquivo' if item_type == 0 else 'Diretório'} não encontrado")
         return False
 
     def create_directory(self, dirname: str) -> bool:
         """Cria um novo diretório"""
-        if len(dirname) > self.MAX_FILENAME - 1:
-            print("Nome muito longo")
+        name_bytes = self._encode_name(dirname)
+        if name_bytes is None:
             return False
 
         entries = self._read_directory()
@@ -299,13 +550,12 @@ class FURGfs3:
             return False
 
         # Inicializa bloco do diretório com zeros
-        dir_position = self.header['data_start'] + \
-            (blocks[0] - 1) * self.BLOCK_SIZE
-        self.file_handle.seek(dir_position)
-        self.file_handle.write(b'\x00' * self.BLOCK_SIZE)
+        dir_position = self._get_directory_block_position(blocks[0])
+        self._write_if_changed(dir_position, self._ZERO_BLOCK)
+        self._invalidate_directory(blocks[0])
 
         # Cria entrada no diretório atual
-        entry = {'name': dirname, 'size': 0, 'start_block': blocks[0],
+        entry = {'name': dirname, 'name_bytes': name_bytes, 'size': 0, 'start_block': blocks[0],
                  'protected': False, 'type': 1, 'timestamp': int(time.time())}
         self._write_directory_entry(entry)
         self._update_fat()
@@ -316,23 +566,10 @@ class FURGfs3:
         """Muda para o diretório especificado"""
         if dirname == "..":  # Navegação para diretório pai
             if len(self.directory_path) > 1:
+                # O bloco do pai já está na pilha: nada é relido do disco
                 self.directory_path.pop()
-                if len(self.directory_path) == 1:
-                    self.current_directory = 0  # Raiz
-                else:
-                    # Reconstroi caminho para encontrar bloco atual
-                    current_block = 0
-                    for path_part in self.directory_path[1:]:
-                        entries = self._read_directory(current_block)
-                        for entry in entries:
-                            if entry['name'] == path_part and entry['type'] == 1:
-                                current_block = entry['start_block']
-                                break
-                        else:
-                            print(
-                                f"Erro: Não foi possível encontrar '{path_part}'")
-                            return False
-                    self.current_directory = current_block
+                self.directory_blocks.pop()
+                self.current_directory = self.directory_blocks[-1]
                 print(f"Diretório atual: {self.get_current_path()}")
                 return True
             else:
@@ -345,6 +582,7 @@ class FURGfs3:
             if entry['name'] == dirname and entry['type'] == 1:
                 self.current_directory, self.directory_path = entry['start_block'], self.directory_path + [
                     dirname]
+                self.directory_blocks.append(entry['start_block'])
                 print(f"Diretório atual: {self.get_current_path()}")
                 return True
         print(f"Diretório '{dirname}' não encontrado")
@@ -362,34 +600,36 @@ class FURGfs3:
             return False
 
         # Libera bloco do diretório
-        self.fat[dir_entry['start_block']] = 0
+        self._set_fat(dir_entry['start_block'], 0)
         dir_position = self._get_directory_block_position(
             self.current_directory)
-        self.file_handle.seek(dir_position + i * self.ENTRY_SIZE)
-        self.file_handle.write(b'\x00' * self.ENTRY_SIZE)  # Limpa entrada
+        self._write_at(dir_position + i * self.ENTRY_SIZE,
+                       b'\x00' * self.ENTRY_SIZE)  # Limpa entrada
+        self._invalidate_directory(self.current_directory)
+        self._invalidate_directory(dir_entry['start_block'])
         self._update_fat()
         print(f"Diretório '{dirname}' removido")
         return True
 
     def _rename_item(self, old_name: str, new_name: str, item_type: int) -> bool:
         """Renomeia arquivo ou diretório"""
-        if len(new_name) > self.MAX_FILENAME - 1:
-            print("Nome muito longo")
+        name_bytes = self._encode_name(new_name)
+        if name_bytes is None:
             return False
 
         entries = self._read_directory()
-        result = self._item_operation(old_name, item_type, 'rename')
+        result = self._item_operation(old_name, item_type, 'rename', entries)
         if not result:
             return False
 
-        i, _ = result
+        i, entry = result
         if any(e['name'] == new_name for e in entries):
             print("Nome já existe")
             return False
 
-        # Atualiza nome na entrada
-        entries[i]['name'] = new_name
-        self._write_directory_entry(entries[i], i)
+        # Atualiza nome numa cópia: a entrada original pertence ao cache
+        self._write_directory_entry(
+            dict(entry, name=new_name, name_bytes=name_bytes), i)
         item_name = "Diretório" if item_type == 1 else "Arquivo"
         print(f"{item_name} renomeado para '{new_name}'")
         return True
@@ -402,8 +642,8 @@ class FURGfs3:
 
     def _create_file_in_fs(self, filename: str, content: bytes) -> bool:
         """Cria um arquivo dentro do sistema de arquivos"""
-        if len(filename) > self.MAX_FILENAME - 1:
-            print("Nome muito longo")
+        name_bytes = self._encode_name(filename)
+        if name_bytes is None:
             return False
 
         entries = self._read_directory()
@@ -419,57 +659,70 @@ class FURGfs3:
             print("Espaço insuficiente")
             return False
 
-        # Escreve conteúdo nos blocos alocados
-        offset = 0
-        for block in blocks:
-            block_start = self.header['data_start'] + \
-                (block - 1) * self.BLOCK_SIZE
-            self.file_handle.seek(block_start)
-            chunk = content[offset:offset + self.BLOCK_SIZE]
-            self.file_handle.write(chunk.ljust(
-                self.BLOCK_SIZE, b'\x00'))  # Preenche com zeros
-            offset += self.BLOCK_SIZE
+        # Escreve conteúdo nos blocos alocados, um trecho contíguo por vez
+        # (as visões são liberadas logo após o uso, pois content pode ser um mmap)
+        offset, base, block_size = 0, self._data_base, self.BLOCK_SIZE
+        with memoryview(content) as view:
+            for start, count in self._group_contiguous(blocks):
+                block_start = base + start * block_size
+                run_size = count * block_size
+                with view[offset:offset + run_size] as chunk:
+                    padding = self._ZERO_BLOCK[:run_size - len(chunk)]  # Preenche com zeros
+                    self._write_at(block_start, chunk)
+                    if padding:
+                        self._write_at(block_start + len(chunk), padding)
+                offset += run_size
 
         # Cria entrada no diretório
-        entry = {'name': filename, 'size': len(content), 'start_block': blocks[0],
+        entry = {'name': filename, 'name_bytes': name_bytes, 'size': len(content), 'start_block': blocks[0],
                  'protected': False, 'type': 0, 'timestamp': int(time.time())}
         self._write_directory_entry(entry)
         self._update_fat()
         return True
 
     def _update_fat(self):
-        """Atualiza a FAT no arquivo (persiste no disco)"""
-        self.file_handle.seek(self.header['fat_start'])
-        for entry in self.fat:
-            self.file_handle.write(struct.pack('<I', entry & 0xFFFFFFFF))
-        self.file_handle.flush()
+        """Atualiza a FAT no arquivo, regravando apenas as páginas sujas"""
+        # Páginas sujas consecutivas formam um único intervalo gravado de uma vez
+        entries_per_page = self.BLOCK_SIZE // self.FAT_ENTRY_SIZE
+        for page, count in self._group_contiguous(sorted(self._fat_dirty_pages)):
+            first = page * entries_per_page
+            self._write_if_changed(self.header['fat_start'] + first * self.FAT_ENTRY_SIZE,
+                                   self._fat_to_bytes(self.fat, first, first + count * entries_per_page))
+        self._fat_dirty_pages.clear()
 
     def copy_to_fs(self, src_path: str, dst_name: str = None) -> bool:
         """Copia arquivo do sistema real para FURGfs3 com verificação de integridade"""
         src_path = src_path.strip('"\'')
-        if not os.path.exists(src_path):
-            print("Arquivo origem não encontrado")
-            return False
-
         dst_name = dst_name.strip(
             '"\'') if dst_name else os.path.basename(src_path)
 
         try:
             with open(src_path, 'rb') as f:
-                content = f.read()
-
-            # Verificação de integridade com MD5
-            original_hash = self._calculate_file_hash(content)
-            print(f"Hash MD5 original: {original_hash}")
+                # Mapeia a origem: hash e cópia leem direto do cache de páginas,
+                # sem materializar o arquivo inteiro em um objeto bytes.
+                # Pipes, /proc e afins (tamanho 0 ou não regulares) são lidos
+                info = os.fstat(f.fileno())
+                mapped = stat.S_ISREG(info.st_mode) and info.st_size > 0
+                content = mmap.mmap(f.fileno(), 0,
+                                    access=mmap.ACCESS_READ) if mapped else f.read()
+                try:
+                    # Verificação de integridade com MD5
+                    original_hash = self._calculate_file_hash(content)
+                    print(f"Hash MD5 original: {original_hash}")
 
-            success = self._create_file_in_fs(dst_name, content)
+                    success = self._create_file_in_fs(dst_name, content)
+                finally:
+                    if mapped:
+                        content.close()
 
             if success:
                 # Verifica se arquivo foi copiado sem corrupção
-                verification_content = self._read_file_from_fs(dst_name)
-                if verification_content:
-                    verification_hash = self._calculate_file_hash(
-                        verification_content)
+                entry = next((e for e in self._read_directory()
+                              if e['name'] == dst_name and e['type'] == 0), None)
+                verification_hash, copied = self._stream_extents(
+                    self._chain_extents(entry['start_block'], entry['size']),
+                    entry['size']) if entry else (None, 0)
+                if copied:
                     print(f"Hash MD5 após cópia: {verification_hash}")
 
                     if original_hash == verification_hash:
@@ -482,10 +735,21 @@ class FURGfs3:
                     print("⚠️  Não foi possível verificar integridade")
 
             return success
+        except FileNotFoundError:
+            # A própria abertura detecta a ausência (sem stat prévio)
+            print("Arquivo origem não encontrado")
+            return False
         except Exception as e:
             print(f"Erro ao copiar arquivo: {e}")
             return False
 
+    def _stat_path(self, path: str) -> Optional[os.stat_result]:
+        """Retorna o stat de um caminho do sistema real, ou None se não existir"""
+        try:
+            return os.stat(path)
+        except (OSError, ValueError):
+            return None
+
     def copy_from_fs(self, src_name: str, dst_path: str) -> bool:
         """Copia arquivo do FURGfs3 para sistema real com verificação de integridade"""
         entries = self._read_directory()
@@ -495,10 +759,18 @@ class FURGfs3:
             print("Arquivo não encontrado no FURGfs3")
             return False
 
-        # Tratamento de caminhos de destino
-        if os.path.exists(dst_path) and os.path.isdir(dst_path):
+        # Tratamento de caminhos de destino (um único stat por caminho)
+        dst_stat = self._stat_path(dst_path)
+        if dst_stat is not None and stat.S_ISDIR(dst_stat.st_mode):
             dst_path = os.path.join(dst_path, src_name)
             print(f"Destino é diretório. Salvando como: {dst_path}")
+            dst_stat = self._stat_path(dst_path)
+
+        # A imagem está mapeada em memória: truncá-la derrubaria o processo
+        if dst_stat is not None and os.path.samestat(
+                dst_stat, os.fstat(self.file_handle.fileno())):
+            print("Erro: Destino é a própria imagem FURGfs3 em uso")
+            return False
 
         # Confirmações de segurança
         if dst_path.endswith('.fs'):
@@ -506,34 +778,29 @@ class FURGfs3:
             if input("Tem certeza? Digite 'CONFIRMO': ") != 'CONFIRMO':
                 print("Operação cancelada")
                 return False
-        elif os.path.exists(dst_path) and os.path.isfile(dst_path):
-            if input(f"Arquivo '{dst_path}' já existe. Sobrescrever? (s/N): ").lower() != 's':
+        elif dst_stat is not None and stat.S_ISREG(dst_stat.st_mode):
+            if input(f"Arquivo '{dst_path}' já existe. Sobrescrever? (s/N): ").strip() not in ('s', 'S'):
                 print("Operação cancelada")
                 return False
 
         try:
-            content_from_fs = self._read_file_from_fs(src_name)
-            if not content_from_fs:
+            extents = self._chain_extents(entry['start_block'], entry['size'])
+            if not extents:
                 print("Erro: Não foi possível ler o arquivo do FURGfs3")
                 return False
 
-            # Verificação de integridade
-            fs_hash = self._calculate_file_hash(content_from_fs)
-            print(f"Hash MD5 no FS: {fs_hash}")
-
             # Cria diretório pai se necessário
             parent_dir = os.path.dirname(dst_path)
             if parent_dir and not os.path.exists(parent_dir):
                 os.makedirs(parent_dir, exist_ok=True)
 
-            # Escreve no sistema real
+            # Escreve no sistema real calculando o hash no mesmo passo
             with open(dst_path, 'wb') as f:
-                f.write(content_from_fs)
+                fs_hash, _ = self._stream_extents(extents, entry['size'], f)
+            print(f"Hash MD5 no FS: {fs_hash}")
 
             # Verifica integridade após cópia
-            with open(dst_path, 'rb') as f:
-                written_content = f.read()
-            written_hash = self._calculate_file_hash(written_content)
+            written_hash = self._hash_real_file(dst_path)
             print(f"Hash MD5 após cópia: {written_hash}")
 
             if fs_hash == written_hash:
@@ -554,33 +821,21 @@ class FURGfs3:
 
     def remove_file(self, filename: str) -> bool:
         """Remove um arquivo liberando seus blocos na FAT"""
-        entries = self._read_directory()
-        entry = next(
-            (e for e in entries if e['name'] == filename and e['type'] == 0), None)
-        if not entry:
-            print("Arquivo não encontrado")
-            return False
-        if entry.get('protected', False):
-            print("Arquivo protegido")
+        result = self._item_operation(filename, 0, 'remove')
+        if not result:
             return False
 
-        # Libera cadeia de blocos na FAT
-        current_block = entry['start_block']
-        while current_block not in [1, 0]:
-            next_block = self.fat[current_block]
-            self.fat[current_block] = 0  # Marca como livre
-            current_block = next_block if next_block != 1 else 0
-
-        # Remove entrada do diretório
-        entries_pos = self._read_directory()
-        for i, e in enumerate(entries_pos):
-            if e['name'] == filename and e['type'] == 0:
-                dir_position = self._get_directory_block_position(
-                    self.current_directory)
-                self.file_handle.seek(dir_position + i * self.ENTRY_SIZE)
-                self.file_handle.write(
-                    b'\x00' * self.ENTRY_SIZE)  # Zera entrada
-                break
+        # Libera cadeia de blocos na FAT, um trecho contíguo por vez
+        i, entry = result
+        for start, count in self._chain_extents(entry['start_block']):
+            self._free_run(start, count)
+
+        # Remove entrada do diretório na posição já encontrada
+        dir_position = self._get_directory_block_position(
+            self.current_directory)
+        self._write_at(dir_position + i * self.ENTRY_SIZE,
+                       b'\x00' * self.ENTRY_SIZE)  # Zera entrada
+        self._invalidate_directory(self.current_directory)
 
         self._update_fat()
         print(f"Arquivo {filename} removido")
@@ -590,8 +845,10 @@ class FURGfs3:
         """Lista arquivos no diretório atual com tamanhos calculados"""
         return self._read_directory(calculate_sizes=True)
 
-    def _format_size(self, bytes_size: int) -> str:
-        """Formata tamanho em bytes para leitura humana"""
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _format_size(bytes_size: int) -> str:
+        """Formata tamanho em bytes para leitura humana (memorizado por valor)"""
         if bytes_size >= 1024 * 1024:
             return f"{bytes_size} bytes ({bytes_size / (1024 * 1024):.2f} MB)"
         elif bytes_size >= 1024:
@@ -603,15 +860,9 @@ class FURGfs3:
         try:
             if not hasattr(self, 'fat') or not self.fat:
                 return (0, 0)
-            free_blocks = sum(1 for x in self.fat if x == 0)
-            # Calcula blocos usados por metadados
-            fat_blocks = (len(self.fat) * self.FAT_ENTRY_SIZE +
-                          self.BLOCK_SIZE - 1) // self.BLOCK_SIZE
-            header_blocks = (self.HEADER_SIZE +
-                             self.BLOCK_SIZE - 1) // self.BLOCK_SIZE
-            metadata_blocks = fat_blocks + header_blocks + 1  # +1 para diretório raiz
-            total_data_blocks = len(self.fat) - metadata_blocks
-            return free_blocks * self.BLOCK_SIZE, total_data_blocks * self.BLOCK_SIZE
+            # Livres e total sobre o mesmo intervalo de blocos alocáveis
+            free_blocks = self._free_map.count(1)  # Contagem feita em C
+            return free_blocks * self.BLOCK_SIZE, self._data_blocks * self.BLOCK_SIZE
         except Exception as e:
             print(f"Erro ao calcular espaço: {e}")
             return (0, 0)
@@ -629,11 +880,17 @@ class FURGfs3:
     def toggle_protection(self, filename: str) -> bool:
         """Alterna proteção de um arquivo ou diretório"""
         entries = self._read_directory()
-        for i, entry in enumerate(entries):
+        for entry in entries:
             if entry['name'] == filename:
-                entry['protected'] = not entry.get('protected', False)
-                self._write_directory_entry(entry, i)
-                status = "protegido" if entry['protected'] else "desprotegido"
+                # Regrava só os 2 bytes do campo na posição real da entrada no
+                # bloco, sem alterar o dict, que pertence ao cache
+                protected = not entry.get('protected', False)
+                dir_position = self._get_directory_block_position(
+                    self.current_directory)
+                self._write_at(dir_position + entry['slot'] * self.ENTRY_SIZE + self._PROTECTED_OFFSET,
+                               self._PROTECTED_STRUCT.pack(int(protected)))
+                self._invalidate_directory(self.current_directory)
+                status = "protegido" if protected else "desprotegido"
                 item_type = "Diretório" if entry['type'] == 1 else "Arquivo"
                 print(f"{item_type} {filename} {status}")
                 return True
@@ -649,11 +906,11 @@ class FURGfs3:
             print("Arquivo não encontrado")
             return False
 
-        content = self._read_file_from_fs(filename)
-        if content:
-            file_hash = self._calculate_file_hash(content)
+        file_hash, size = self._stream_extents(self._chain_extents(
+            entry['start_block'], entry['size']), entry['size'])
+        if size:
             print(f"Hash MD5 do '{filename}': {file_hash}")
-            print(f"Tamanho: {self._format_size(len(content))}")
+            print(f"Tamanho: {self._format_size(size)}")
             return True
         else:
             print("Não foi possível ler o arquivo")
@@ -663,12 +920,128 @@ class FURGfs3:
         """Retorna o caminho atual como string"""
         if not hasattr(self, 'directory_path') or not self.directory_path:
             return "/"
-        return "/" if len(self.directory_path) == 1 else "/".join(self.directory_path)
+        # directory_path já guarda os componentes ("/" seguido dos nomes)
+        return "/" + "/".join(self.directory_path[1:])
 
     def close(self):
         """Fecha o sistema de arquivos"""
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
         if self.file_handle:
             self.file_handle.close()
+            self.file_handle = None
+
+
+@lru_cache(maxsize=4096)
+def _format_timestamp(timestamp: int) -> str:
+    """Formata um timestamp para listagem, uma única vez por valor distinto"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+# Cabeçalho da listagem em tabela (opção 7), montado uma única vez
+LISTING_HEADER = f"{'Tipo':<6} {'Nome':<20} {'Tamanho':<25} {'P':<2} {'Data':<20}"
+LISTING_SEPARATOR = "-" * 73
+
+
+def _table_row(item_type: str, name: str, size_info: str, protected: bool, timestamp: str) -> str:
+    """Linha da listagem em tabela (opção 7)"""
+    # Colunas de largura fixa com ljust (sem a minilinguagem de formatação)
+    return " ".join((item_type.ljust(6), name.ljust(20), size_info.ljust(25),
+                     "S " if protected else "N ", timestamp))
+
+
+def _summary_row(item_type: str, name: str, size_info: str, protected: bool, timestamp: str) -> str:
+    """Linha da listagem resumida exibida ao abrir um sistema"""
+    return f"  {item_type} {name} ({size_info}) {timestamp}{' [P]' if protected else ''}"
+
+
+def _print_listing(fs: FURGfs3, formatted: bool):
+    """Exibe os itens do diretório atual: tabela (opção 7) ou resumo (ao abrir)"""
+    arquivos = fs.list_files()
+    if not arquivos:
+        if formatted:
+            print("Nenhum item encontrado")
+        return
+
+    # Escolhe o formato uma vez; monta a listagem inteira e a exibe com uma única escrita
+    if formatted:
+        format_row, rows = _table_row, [LISTING_HEADER, LISTING_SEPARATOR]
+    else:
+        format_row, rows = _summary_row, [f"Itens ({len(arquivos)}):"]
+    for arq in arquivos:
+        # Lê cada campo da entrada uma única vez
+        is_dir = arq['type'] == 1
+        size = arq.get('calculated_size', 0) if is_dir else arq['size']
+        size_info = "vazio" if is_dir and size <= 0 else fs._format_size(size)
+        rows.append(format_row("[DIR]" if is_dir else "[ARQ]", arq['name'], size_info,
+                               arq.get('protected', False),
+                               _format_timestamp(arq.get('timestamp', 0))))
+    print("\n".join(rows))
+
+
+def _print_space(fs: FURGfs3):
+    """Exibe o espaço total, usado e livre do sistema"""
+    free_f, used_f, total_f = fs.get_space_info_formatted()
+    print(f"Total: {total_f}, Usado: {used_f}, Livre: {free_f}")
+
+
+def _cmd_copy_to(fs: FURGfs3):
+    """Opção 3: copia um arquivo do sistema real para o FS"""
+    origem, destino = input("Arquivo origem: "), input(
+        "Nome no FS (Enter=mesmo): ").strip()
+    fs.copy_to_fs(origem, destino if destino else None)
+
+
+def _cmd_copy_from(fs: FURGfs3):
+    """Opção 4: copia um arquivo do FS para o sistema real"""
+    origem, destino = input("Arquivo no FS: "), input("Destino: ")
+    fs.copy_from_fs(origem, destino)
+
+
+def _cmd_rename_file(fs: FURGfs3):
+    """Opção 5: renomeia um arquivo"""
+    antigo, novo = input("Nome atual: "), input("Novo nome: ")
+    fs.rename_file(antigo, novo)
+
+
+def _cmd_remove_file(fs: FURGfs3):
+    """Opção 6: remove um arquivo após confirmação"""
+    nome = input("Arquivo: ")
+    if input(f"Remover '{nome}'? (s/N): ").strip() in ('s', 'S'):
+        fs.remove_file(nome)
+
+
+def _cmd_rename_directory(fs: FURGfs3):
+    """Opção 12: renomeia um diretório"""
+    antigo, novo = input("Nome atual: "), input("Novo nome: ")
+    fs.rename_directory(antigo, novo)
+
+
+def _cmd_remove_directory(fs: FURGfs3):
+    """Opção 13: remove um diretório após confirmação"""
+    nome = input("Diretório a remover: ")
+    if input(f"Remover '{nome}'? (s/N): ").strip() in ('s', 'S'):
+        fs.remove_directory(nome)
+
+
+# Opções que exigem um sistema carregado: despacho direto por dicionário
+FS_COMMANDS = {
+    '3': _cmd_copy_to,
+    '4': _cmd_copy_from,
+    '5': _cmd_rename_file,
+    '6': _cmd_remove_file,
+    '7': lambda fs: _print_listing(fs, formatted=True),
+    '8': _print_space,
+    '9': lambda fs: fs.toggle_protection(input("Nome: ")),
+    '10': lambda fs: fs.create_directory(input("Nome do diretório: ")),
+    '11': lambda fs: fs.change_directory(input("Diretório (.. para voltar): ")),
+    '12': _cmd_rename_directory,
+    '13': _cmd_remove_directory,
+    '14': lambda fs: fs.verify_file_integrity(
+        input("Arquivo para verificar integridade: ")),
+}
 
 
 def main():
@@ -686,8 +1059,15 @@ def main():
 
         try:
             opcao = input("Opção: ").strip()
+            command = FS_COMMANDS.get(opcao)
 
-            if opcao == '1':
+            if command is not None:
+                if not fs.filename:
+                    print("Nenhum sistema carregado")
+                    continue
+                command(fs)
+
+            elif opcao == '1':
                 # Cria novo sistema de arquivos
                 nome, tamanho = input("Nome do sistema (sem .fs): "), int(
                     input("Tamanho MB (1-10000): "))
@@ -711,88 +1091,8 @@ def main():
                 if fs._load_filesystem():
                     print("Sistema carregado")
                     # Exibe informações do sistema
-                    free_f, used_f, total_f = fs.get_space_info_formatted()
-                    print(
-                        f"Total: {total_f}, Usado: {used_f}, Livre: {free_f}")
-                    arquivos = fs.list_files()
-                    if arquivos:
-                        print(f"Itens ({len(arquivos)}):")
-                        for arq in arquivos:
-                            timestamp = time.strftime(
-                                '%Y-%m-%d %H:%M:%S', time.localtime(arq.get('timestamp', 0)))
-                            protected = " [P]" if arq.get(
-                                'protected', False) else ""
-                            item_type = "[DIR]" if arq['type'] == 1 else "[ARQ]"
-                            if arq['type'] == 1:
-                                size_info = f"({fs._format_size(arq.get('calculated_size', 0))})" if arq.get(
-                                    'calculated_size', 0) > 0 else "(vazio)"
-                            else:
-                                size_info = f"({fs._format_size(arq['size'])})"
-                            print(
-                                f"  {item_type} {arq['name']} {size_info} {timestamp}{protected}")
-
-            elif opcao in ['3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14']:
-                if not fs.filename:
-                    print("Nenhum sistema carregado")
-                    continue
-
-                if opcao == '3':
-                    origem, destino = input("Arquivo origem: "), input(
-                        "Nome no FS (Enter=mesmo): ").strip()
-                    fs.copy_to_fs(origem, destino if destino else None)
-                elif opcao == '4':
-                    origem, destino = input(
-                        "Arquivo no FS: "), input("Destino: ")
-                    fs.copy_from_fs(origem, destino)
-                elif opcao == '5':
-                    antigo, novo = input("Nome atual: "), input("Novo nome: ")
-                    fs.rename_file(antigo, novo)
-                elif opcao == '6':
-                    nome = input("Arquivo: ")
-                    if input(f"Remover '{nome}'? (s/N): ").lower() == 's':
-                        fs.remove_file(nome)
-                elif opcao == '7':
-                    # Listagem formatada
-                    arquivos = fs.list_files()
-                    if arquivos:
-                        print(
-                            f"{'Tipo':<6} {'Nome':<20} {'Tamanho':<25} {'P':<2} {'Data':<20}")
-                        print("-" * 73)
-                        for arq in arquivos:
-                            timestamp = time.strftime(
-                                '%Y-%m-%d %H:%M:%S', time.localtime(arq.get('timestamp', 0)))
-                            protected = "S" if arq.get(
-                                'protected', False) else "N"
-                            item_type = "[DIR]" if arq['type'] == 1 else "[ARQ]"
-                            if arq['type'] == 1:
-                                size_info = fs._format_size(arq.get('calculated_size', 0)) if arq.get(
-                                    'calculated_size', 0) > 0 else "vazio"
-                            else:
-                                size_info = fs._format_size(arq['size'])
-                            print(
-                                f"{item_type:<6} {arq['name']:<20} {size_info:<25} {protected:<2} {timestamp}")
-                    else:
-                        print("Nenhum item encontrado")
-                elif opcao == '8':
-                    free_f, used_f, total_f = fs.get_space_info_formatted()
-                    print(
-                        f"Total: {total_f}, Usado: {used_f}, Livre: {free_f}")
-                elif opcao == '9':
-                    fs.toggle_protection(input("Nome: "))
-                elif opcao == '10':
-                    fs.create_directory(input("Nome do diretório: "))
-                elif opcao == '11':
-                    fs.change_directory(input("Diretório (.. para voltar): "))
-                elif opcao == '12':
-                    antigo, novo = input("Nome atual: "), input("Novo nome: ")
-                    fs.rename_directory(antigo, novo)
-                elif opcao == '13':
-                    nome = input("Diretório a remover: ")
-                    if input(f"Remover '{nome}'? (s/N): ").lower() == 's':
-                        fs.remove_directory(nome)
-                elif opcao == '14':
-                    fs.verify_file_integrity(
-                        input("Arquivo para verificar integridade: "))
+                    _print_space(fs)
+                    _print_listing(fs, formatted=False)
 
             elif opcao == '0':
                 fs.close()